@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from zoneinfo import ZoneInfo
+import clock
+from aiogram.utils.exceptions import (
+    MessageCantBeEdited,
+    MessageNotModified,
+    MessageToEditNotFound,
+    RetryAfter,
+    TelegramAPIError,
+)
+from config import NOTIFICATION_GROUP_ID, SLA_BOARD_INTERVAL
+from database import db
+from task_index import open_tasks
+from working_hours import get_working_minutes_between
+
+logger = logging.getLogger(__name__)
+
+# Ключ в таблице bot_state, под которым хранится ID сообщения табло
+BOARD_STATE_KEY = 'sla_board_message_id'
+# Ограничение Telegram на длину текста сообщения
+MAX_MESSAGE_LENGTH = 4096
+
+
+class SlaBoard:
+    """Закрепленное сообщение со списком открытых задач, отсортированным по остатку SLA.
+
+    Данные берутся из индекса открытых задач, без запросов к БД.
+    Сообщение перерисовывается не чаще одного раза за интервал и только при изменении
+    текста, поэтому число запросов к Telegram не зависит от количества задач.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.bot = None
+        self.message_id = None
+        self._last_text = None
+        self._task = None
+
+    async def start(self, bot):
+        """Восстановление ID сообщения табло и запуск цикла обновления."""
+        self.bot = bot
+        message_id = await db.get_state(BOARD_STATE_KEY)
+        self.message_id = int(message_id) if message_id else None
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Табло SLA запущено, интервал обновления {self.interval} с.")
+
+    async def stop(self):
+        """Остановка цикла обновления табло."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+            logger.info("Табло SLA остановлено.")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except RetryAfter as e:
+                logger.warning(f"Превышен лимит Telegram при обновлении табло, ожидание {e.timeout} с.")
+                # retry_after задается в реальных секундах, а не во времени бота
+                await asyncio.sleep(e.timeout)
+                continue
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении табло SLA: {e}")
+            await clock.sleep(self.interval)
+
+    async def render(self):
+        """Формирование текста табло по индексу открытых задач."""
+        moscow_tz = ZoneInfo('Europe/Moscow')
+        now = clock.now(moscow_tz)
+
+        text = f"📋 Открытые задачи: {len(open_tasks)}\nОбновлено: {now.strftime('%H:%M')}\n"
+        if not len(open_tasks):
+            return text + "\nОткрытых задач нет."
+
+        text += "\n"
+        # Задачи идут по возрастанию дедлайна, остаток считается только для попавших в сообщение
+        for index, entry in enumerate(open_tasks.iter_by_deadline()):
+            remaining = int(get_working_minutes_between(now, entry.deadline)) if entry.deadline > now else 0
+            status = f"осталось {remaining} мин." if remaining > 0 else "SLA просрочен"
+            line = f"{'🔴' if remaining <= 15 else '🟢'} \"{entry.chat_title or 'Неизвестный чат'}\" — {status}\n"
+            tail = f"…и еще {len(open_tasks) - index}"
+            if len(text) + len(line) + len(tail) > MAX_MESSAGE_LENGTH:
+                return text + tail
+            text += line
+        return text
+
+    async def refresh(self):
+        """Обновление сообщения табло, если его текст изменился."""
+        text = await self.render()
+        if text == self._last_text:
+            return
+
+        if self.message_id:
+            try:
+                await self.bot.edit_message_text(text, NOTIFICATION_GROUP_ID, self.message_id)
+            except MessageNotModified:
+                pass
+            except (MessageToEditNotFound, MessageCantBeEdited):
+                logger.warning(f"Сообщение табло {self.message_id} недоступно, будет создано новое.")
+                self.message_id = None
+
+        if not self.message_id:
+            message = await self.bot.send_message(NOTIFICATION_GROUP_ID, text)
+            self.message_id = message.message_id
+            await db.set_state(BOARD_STATE_KEY, str(self.message_id))
+            try:
+                await self.bot.pin_chat_message(NOTIFICATION_GROUP_ID, self.message_id, disable_notification=True)
+            except TelegramAPIError as e:
+                logger.warning(f"Не удалось закрепить сообщение табло: {e}")
+
+        self._last_text = text
+
+
+# Создание глобального экземпляра табло
+sla_board = SlaBoard(SLA_BOARD_INTERVAL)
@@ -0,0 +1,31 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from config import TIME_SCALE, TIME_ORIGIN
+
+# Источник времени бота. В обычном режиме совпадает с системными часами.
+# При TIME_SCALE > 1 время идет ускоренно от момента TIME_ORIGIN (unix time),
+# что позволяет прогонять многочасовые сценарии за минуты (см. tools/soak_test.py).
+
+
+def timestamp():
+    """Текущее время бота в секундах unix time."""
+    real = time.time()
+    if TIME_SCALE == 1:
+        return real
+    return TIME_ORIGIN + (real - TIME_ORIGIN) * TIME_SCALE
+
+
+def now(tz=None):
+    """Аналог datetime.now(tz) с учетом масштаба времени."""
+    return datetime.fromtimestamp(timestamp(), tz)
+
+
+def utcnow():
+    """Аналог datetime.utcnow() (наивное время в UTC) с учетом масштаба времени."""
+    return datetime.fromtimestamp(timestamp(), timezone.utc).replace(tzinfo=None)
+
+
+async def sleep(seconds):
+    """Ожидание в секундах времени бота."""
+    await asyncio.sleep(seconds / TIME_SCALE)
@@ -1,4 +1,5 @@
 import os
+import time
 from cryptography.fernet import Fernet
 from dotenv import load_dotenv
 
@@ -19,7 +20,24 @@ DB_HOST = os.getenv('DB_HOST')
 DB_PORT = os.getenv('DB_PORT')
 NOTIFICATION_GROUP_ID = int(os.getenv('NOTIFICATION_GROUP_ID'))
 TIMEZONE = os.getenv('TIMEZONE')
+# ID отслеживаемых клиентских чатов через запятую; если не задано, отслеживаются все группы
+MONITORED_CHAT_IDS = {int(chat_id) for chat_id in os.getenv('MONITORED_CHAT_IDS', '').split(',') if chat_id.strip()}
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')  
+# Часовой пояс, в котором планировщик считает расписание задач (отчеты, очистка)
+SCHEDULER_TIMEZONE = os.getenv('SCHEDULER_TIMEZONE', 'Europe/Moscow')
+# Режим табло SLA: одно закрепленное сообщение вместо отдельных предупреждений
+SLA_BOARD_ENABLED = os.getenv('SLA_BOARD_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+SLA_BOARD_INTERVAL = int(os.getenv('SLA_BOARD_INTERVAL', '60'))
+# Каталог для результатов профилирования (/profile); вне /app, который смонтирован из исходников
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/sla_bot_profiles')
+# Кэш username -> user_id: размер и интервал сохранения в БД (секунды)
+KNOWN_USERS_CACHE_SIZE = int(os.getenv('KNOWN_USERS_CACHE_SIZE', '10000'))
+KNOWN_USERS_FLUSH_INTERVAL = int(os.getenv('KNOWN_USERS_FLUSH_INTERVAL', '60'))
+# Адрес Bot API (например, локальный сервер или tools/fake_bot_api.py); по умолчанию api.telegram.org
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
+# Ускорение времени бота для нагрузочных прогонов (1 - реальное время)
+TIME_SCALE = float(os.getenv('TIME_SCALE', '1'))
+TIME_ORIGIN = float(os.getenv('TIME_ORIGIN') or time.time())
 
 # Проверка наличия ключа шифрования
 if not ENCRYPTION_KEY:
@@ -1,6 +1,7 @@
 import asyncpg
 import logging
 import datetime
+import clock
 from config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
 
 logger = logging.getLogger(__name__)
@@ -71,6 +72,33 @@ class Database:
                         last_updated TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
                     );
                 """)
+                # Создание таблицы scheduled_jobs
+                await connection.execute("""
+                    CREATE TABLE IF NOT EXISTS scheduled_jobs (
+                        name TEXT PRIMARY KEY,
+                        last_run TIMESTAMP WITHOUT TIME ZONE NOT NULL
+                    );
+                """)
+                # Создание таблицы known_users
+                await connection.execute("""
+                    CREATE TABLE IF NOT EXISTS known_users (
+                        user_id BIGINT PRIMARY KEY,
+                        username TEXT NOT NULL,
+                        updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+                    );
+                """)
+                # Индексы для поиска пользователей по username
+                await connection.execute("""
+                    CREATE INDEX IF NOT EXISTS known_users_username_idx ON known_users (lower(username));
+                    CREATE INDEX IF NOT EXISTS staff_username_idx ON staff (lower(username));
+                """)
+                # Создание таблицы bot_state
+                await connection.execute("""
+                    CREATE TABLE IF NOT EXISTS bot_state (
+                        key TEXT PRIMARY KEY,
+                        value TEXT
+                    );
+                """)
             logger.info("Таблицы готовы.")
         except Exception as e:
             logger.error(f"Ошибка при создании таблиц: {e}")
@@ -82,9 +110,10 @@ class Database:
         """Добавление или обновление сотрудника."""
         try:
             async with self.pool.acquire() as connection:
+                # Если username не указан, берем последний известный по сообщениям
                 await connection.execute("""
                     INSERT INTO staff (user_id, username, role)
-                    VALUES ($1, $2, $3)
+                    VALUES ($1, COALESCE($2, (SELECT username FROM known_users WHERE user_id = $1)), $3)
                     ON CONFLICT (user_id) DO UPDATE SET username = EXCLUDED.username, role = EXCLUDED.role
                 """, user_id, username, role)
                 logger.info(f"Добавлен или обновлен пользователь {user_id} с ролью {role}.")
@@ -126,19 +155,72 @@ class Database:
             logger.error(f"Ошибка при получении списка сотрудников: {e}")
             return []
 
+    async def get_known_user_id(self, username):
+        """Получение ID пользователя по username из таблицы известных пользователей."""
+        try:
+            async with self.pool.acquire() as connection:
+                result = await connection.fetchrow("""
+                    SELECT user_id FROM known_users WHERE lower(username) = lower($1)
+                    ORDER BY updated_at DESC LIMIT 1
+                """, username)
+                return result['user_id'] if result else None
+        except Exception as e:
+            logger.error(f"Ошибка при получении ID пользователя @{username}: {e}")
+            return None
+
+    async def get_staff_user_id(self, username):
+        """Получение ID сотрудника по username, сохраненному при добавлении в staff."""
+        try:
+            async with self.pool.acquire() as connection:
+                result = await connection.fetchrow("""
+                    SELECT user_id FROM staff WHERE lower(username) = lower($1)
+                """, username)
+                return result['user_id'] if result else None
+        except Exception as e:
+            logger.error(f"Ошибка при получении ID сотрудника @{username}: {e}")
+            return None
+
+    async def save_known_users(self, users):
+        """Пакетное сохранение пар (user_id, username) и обновление username сотрудников."""
+        try:
+            user_ids = [user_id for user_id, _ in users]
+            usernames = [username for _, username in users]
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    await connection.execute("""
+                        INSERT INTO known_users (user_id, username, updated_at)
+                        SELECT user_id, username, $3 FROM unnest($1::BIGINT[], $2::TEXT[]) AS u(user_id, username)
+                        ON CONFLICT (user_id) DO UPDATE SET
+                            username = EXCLUDED.username,
+                            updated_at = EXCLUDED.updated_at
+                    """, user_ids, usernames, clock.utcnow())
+                    await connection.execute("""
+                        UPDATE staff SET username = u.username
+                        FROM unnest($1::BIGINT[], $2::TEXT[]) AS u(user_id, username)
+                        WHERE staff.user_id = u.user_id AND staff.username IS DISTINCT FROM u.username
+                    """, user_ids, usernames)
+            logger.debug(f"Сохранено известных пользователей: {len(users)}.")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении известных пользователей: {e}")
+            return False
+
     # === Методы для управления задачами ===
 
     async def create_task(self, chat_id, chat_title):
-        """Создание задачи."""
+        """Создание задачи. Возвращает созданную запись."""
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute("""
+                result = await connection.fetchrow("""
                     INSERT INTO tasks (chat_id, chat_title, created_at)
                     VALUES ($1, $2, $3)
-                """, chat_id, chat_title, datetime.datetime.utcnow())
+                    RETURNING *
+                """, chat_id, chat_title, clock.utcnow())
                 logger.info(f"Создана задача для чата {chat_id} ({chat_title}).")
+                return result
         except Exception as e:
             logger.error(f"Ошибка при создании задачи для чата {chat_id}: {e}")
+            return None
 
     async def get_open_task_by_chat_id(self, chat_id):
         """Получение открытой задачи по ID чата."""
@@ -184,7 +266,7 @@ class Database:
                     UPDATE tasks
                     SET is_closed = TRUE, closed_at = $1, closed_by = $2
                     WHERE id = $3
-                """, datetime.datetime.utcnow(), closed_by, task_id)
+                """, clock.utcnow(), closed_by, task_id)
                 logger.info(f"Задача {task_id} закрыта пользователем {closed_by}.")
         except Exception as e:
             logger.error(f"Ошибка при закрытии задачи {task_id}: {e}")
@@ -227,7 +309,7 @@ class Database:
     async def cleanup_old_tasks(self):
         """Очистка старых задач, закрытых более двух недель назад."""
         try:
-            two_weeks_ago = datetime.datetime.utcnow() - datetime.timedelta(weeks=2)
+            two_weeks_ago = clock.utcnow() - datetime.timedelta(weeks=2)
             async with self.pool.acquire() as connection:
                 deleted_records = await connection.execute("""
                     DELETE FROM tasks
@@ -257,10 +339,13 @@ class Database:
 
     # === Методы для отчетов ===
 
-    async def get_support_activity_last_week(self):
-        """Получение активности сотрудников техподдержки за последнюю неделю."""
+    async def get_support_activity_last_week(self, raise_errors=False):
+        """Получение активности сотрудников техподдержки за последнюю неделю.
+
+        При raise_errors=True ошибки БД пробрасываются, а не заменяются пустым списком.
+        """
         try:
-            last_week = datetime.datetime.utcnow() - datetime.timedelta(days=7)
+            last_week = clock.utcnow() - datetime.timedelta(days=7)
             async with self.pool.acquire() as connection:
                 result = await connection.fetch("""
                     SELECT sa.username, sa.responses
@@ -272,12 +357,17 @@ class Database:
                 return result
         except Exception as e:
             logger.error(f"Ошибка при получении активности за последнюю неделю: {e}")
+            if raise_errors:
+                raise
             return []
 
-    async def get_sla_violations_last_week(self):
-        """Получение просроченных задач за последнюю неделю."""
+    async def get_sla_violations_last_week(self, raise_errors=False):
+        """Получение просроченных задач за последнюю неделю.
+
+        При raise_errors=True ошибки БД пробрасываются, а не заменяются пустым списком.
+        """
         try:
-            last_week = datetime.datetime.utcnow() - datetime.timedelta(days=7)
+            last_week = clock.utcnow() - datetime.timedelta(days=7)
             async with self.pool.acquire() as connection:
                 result = await connection.fetch("""
                     SELECT chat_title, created_at, closed_at
@@ -288,6 +378,8 @@ class Database:
                 return result
         except Exception as e:
             logger.error(f"Ошибка при получении просроченных задач: {e}")
+            if raise_errors:
+                raise
             return []
 
     async def get_tasks_closed_between(self, start_date, end_date):
@@ -303,6 +395,75 @@ class Database:
             logger.error(f"Ошибка при получении задач, закрытых в период с {start_date} по {end_date}: {e}")
             return []
 
+    # === Методы для планировщика ===
+
+    async def register_job(self, name, last_run):
+        """Регистрация задачи планировщика, если она еще не записана."""
+        try:
+            async with self.pool.acquire() as connection:
+                await connection.execute("""
+                    INSERT INTO scheduled_jobs (name, last_run)
+                    VALUES ($1, $2)
+                    ON CONFLICT (name) DO NOTHING
+                """, name, last_run)
+        except Exception as e:
+            logger.error(f"Ошибка при регистрации задачи планировщика {name}: {e}")
+
+    async def claim_job_run(self, name, slot):
+        """Атомарная отметка запуска задачи за слот. Возвращает True, если слот еще не был выполнен.
+
+        Ошибки БД пробрасываются, чтобы планировщик повторил попытку, а не счел слот выполненным.
+        """
+        try:
+            async with self.pool.acquire() as connection:
+                result = await connection.fetchrow("""
+                    UPDATE scheduled_jobs SET last_run = $2
+                    WHERE name = $1 AND last_run < $2
+                    RETURNING name
+                """, name, slot)
+                return result is not None
+        except Exception as e:
+            logger.error(f"Ошибка при отметке запуска задачи планировщика {name}: {e}")
+            raise
+
+    async def release_job_run(self, name, slot, previous_slot):
+        """Отмена отметки запуска за слот после неудачного выполнения задачи."""
+        try:
+            async with self.pool.acquire() as connection:
+                await connection.execute("""
+                    UPDATE scheduled_jobs SET last_run = $3
+                    WHERE name = $1 AND last_run = $2
+                """, name, slot, previous_slot)
+        except Exception as e:
+            logger.error(f"Ошибка при отмене отметки запуска задачи планировщика {name}: {e}")
+            raise
+
+    # === Методы для служебного состояния бота ===
+
+    async def get_state(self, key):
+        """Получение значения служебного состояния по ключу."""
+        try:
+            async with self.pool.acquire() as connection:
+                result = await connection.fetchrow("""
+                    SELECT value FROM bot_state WHERE key = $1
+                """, key)
+                return result['value'] if result else None
+        except Exception as e:
+            logger.error(f"Ошибка при получении состояния {key}: {e}")
+            return None
+
+    async def set_state(self, key, value):
+        """Сохранение значения служебного состояния."""
+        try:
+            async with self.pool.acquire() as connection:
+                await connection.execute("""
+                    INSERT INTO bot_state (key, value)
+                    VALUES ($1, $2)
+                    ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+                """, key, value)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении состояния {key}: {e}")
+
     db = None  # Инициализация переменной для экземпляра базы данных
 
 
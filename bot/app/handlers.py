@@ -1,14 +1,23 @@
 import logging
 import asyncio
-from datetime import datetime, timedelta, time, timezone
+from datetime import timedelta, timezone
 from aiogram import types, Dispatcher
 from aiogram.types import ChatType, ContentType
 from zoneinfo import ZoneInfo  
-from config import NOTIFICATION_GROUP_ID
+import clock
+from config import MONITORED_CHAT_IDS, NOTIFICATION_GROUP_ID, SLA_BOARD_ENABLED
 from database import db
+from task_index import open_tasks
+from profiling import MAX_PROFILE_SECONDS, profiler, set_slow_callback_detection, tracer
+from update_filter import update_filter
+from known_users import known_users
+from working_hours import SLA_MINUTES, is_working_hours, get_next_working_period_start, get_working_minutes_between
 
 logger = logging.getLogger(__name__)
 
+# Количество задач на одной странице ответа /status
+STATUS_PAGE_SIZE = 20
+
 bot = None  
 
 def set_bot(b):
@@ -18,85 +27,6 @@ def set_bot(b):
 
 # === Вспомогательные функции ===
 
-def is_working_hours(now=None):
-    """Проверяет, является ли указанное время рабочим."""
-    try:
-        moscow_tz = ZoneInfo('Europe/Moscow')
-        now = now or datetime.now(moscow_tz)
-        weekday = now.weekday()  # 0 - Понедельник, 6 - Воскресенье
-        current_time = now.time()
-
-        if weekday < 5:  # Будни
-            start_time = time(7, 0)
-            end_time = time(23, 0)
-        else:  # Выходные
-            start_time = time(10, 0)
-            end_time = time(19, 0)
-
-        return start_time <= current_time < end_time
-    except Exception as e:
-        logger.error(f"Ошибка в функции is_working_hours: {e}")
-        return False
-
-def get_next_working_period_start(now=None):
-    
-    try:
-        moscow_tz = ZoneInfo('Europe/Moscow')
-        now = now or datetime.now(moscow_tz)
-        current_date = now.date()
-
-        days_ahead = 0
-        while True:
-            next_date = current_date + timedelta(days=days_ahead)
-            next_weekday = next_date.weekday()
-            if next_weekday < 5:
-                start_time = time(7, 0)
-            else:
-                start_time = time(10, 0)
-            next_start_datetime = datetime.combine(next_date, start_time, tzinfo=moscow_tz)
-            if next_start_datetime > now:
-                return next_start_datetime
-            days_ahead += 1
-    except Exception as e:
-        logger.error(f"Ошибка в функции get_next_working_period_start: {e}")
-        return now or datetime.now()
-
-def get_working_minutes_between(start_dt, end_dt):
-    """Вычисляет количество рабочих минут между двумя датами."""
-    try:
-        total_minutes = 0
-        current_dt = start_dt
-        moscow_tz = ZoneInfo('Europe/Moscow')
-
-        while current_dt < end_dt:
-            weekday = current_dt.weekday()
-            if weekday < 5:
-                start_time = time(7, 0)
-                end_time = time(23, 0)
-            else:
-                start_time = time(10, 0)
-                end_time = time(19, 0)
-
-            working_start = datetime.combine(current_dt.date(), start_time, tzinfo=moscow_tz)
-            working_end = datetime.combine(current_dt.date(), end_time, tzinfo=moscow_tz)
-
-            if current_dt < working_start:
-                current_dt = working_start
-
-            if current_dt >= working_end:
-                current_dt = datetime.combine(current_dt.date() + timedelta(days=1), time(0, 0), tzinfo=moscow_tz)
-                continue
-
-            interval_end = min(end_dt, working_end)
-            minutes = (interval_end - current_dt).total_seconds() / 60
-            total_minutes += minutes
-            current_dt = interval_end
-
-        return total_minutes
-    except Exception as e:
-        logger.error(f"Ошибка в функции get_working_minutes_between: {e}")
-        return 0
-
 async def manage_user_role(message, role_to_add=None, role_to_remove=None):
     """Добавление или удаление ролей пользователей."""
     try:
@@ -134,9 +64,7 @@ async def manage_user_role(message, role_to_add=None, role_to_remove=None):
 async def get_user_id_by_username(username):
     """Получение ID пользователя по username."""
     try:
-        async with db.pool.acquire() as connection:
-            result = await connection.fetchrow("""SELECT user_id FROM staff WHERE username = $1""", username)
-            return result['user_id'] if result else None
+        return await known_users.resolve(username)
     except Exception as e:
         logger.error(f"Ошибка в функции get_user_id_by_username: {e}")
         return None
@@ -195,7 +123,8 @@ async def close_task_handler(message: types.Message):
     """Обработчик команды /close."""
     try:
         user_id = message.from_user.id
-        role = await db.get_user_role(user_id)
+        with tracer.span('role_lookup'):
+            role = await db.get_user_role(user_id)
 
         if role not in ['support', 'admin']:
             await message.reply("У вас нет прав для выполнения этой команды.")
@@ -207,14 +136,18 @@ async def close_task_handler(message: types.Message):
             return
 
         chat_title = args.strip('"')
-        task = await db.get_open_task_by_chat_title(chat_title)
+        with tracer.span('task_lookup'):
+            task = await db.get_open_task_by_chat_title(chat_title)
 
         if task:
-            await db.close_task(task['id'], user_id)
-            await bot.send_message(
-                NOTIFICATION_GROUP_ID,
-                f"✅ Задача для чата \"{chat_title}\" успешно закрыта."
-            )
+            with tracer.span('db_write'):
+                await db.close_task(task['id'], user_id)
+            open_tasks.remove(task['id'])
+            with tracer.span('send'):
+                await bot.send_message(
+                    NOTIFICATION_GROUP_ID,
+                    f"✅ Задача для чата \"{chat_title}\" успешно закрыта."
+                )
             # Удалено двойное логирование о закрытии задачи
         else:
             await message.reply(f"⚠️ Задача для чата \"{chat_title}\" не найдена или уже закрыта.")
@@ -223,6 +156,131 @@ async def close_task_handler(message: types.Message):
         logger.error(f"Ошибка в обработчике /close: {e}")
         await message.reply("Произошла ошибка при закрытии задачи.")
 
+async def status_handler(message: types.Message):
+    """Обработчик команды /status [страница] [фильтр по названию чата]."""
+    try:
+        user_id = message.from_user.id
+        role = await db.get_user_role(user_id)
+
+        if role not in ['support', 'admin']:
+            await message.reply("У вас нет прав для выполнения этой команды.")
+            return
+
+        args = message.get_args().strip()
+        page = 1
+        parts = args.split(maxsplit=1)
+        if parts and parts[0].isdigit():
+            page = max(int(parts[0]), 1)
+            args = parts[1] if len(parts) > 1 else ''
+        title_filter = args.strip('"').lower()
+
+        predicate = None
+        if title_filter:
+            predicate = lambda entry: title_filter in (entry.chat_title or '').lower()
+        entries = open_tasks.page(STATUS_PAGE_SIZE, (page - 1) * STATUS_PAGE_SIZE, predicate)
+
+        if not entries:
+            await message.reply("Открытых задач не найдено." if page == 1 else f"На странице {page} задач нет.")
+            return
+
+        moscow_tz = ZoneInfo('Europe/Moscow')
+        now = clock.now(moscow_tz)
+        filter_note = f" по фильтру \"{title_filter}\"" if title_filter else ""
+        lines = [f"📋 Открытые задачи{filter_note}, страница {page} (всего открытых задач: {len(open_tasks)}):"]
+        for number, entry in enumerate(entries, start=(page - 1) * STATUS_PAGE_SIZE + 1):
+            deadline = entry.deadline.astimezone(moscow_tz)
+            deadline_str = deadline.strftime('%H:%M' if deadline.date() == now.date() else '%d.%m %H:%M')
+            status = "SLA просрочен" if deadline <= now else f"SLA до {deadline_str}"
+            lines.append(f"{number}. \"{entry.chat_title or 'Неизвестный чат'}\" — {status}")
+        await message.reply("\n".join(lines))
+    except Exception as e:
+        logger.error(f"Ошибка в обработчике /status: {e}")
+        await message.reply("Произошла ошибка при получении списка задач.")
+
+# === Диагностика (только для администраторов) ===
+
+async def is_admin(message):
+    """Проверка роли admin с ответом об отсутствии прав."""
+    role = await db.get_user_role(message.from_user.id)
+    if role != 'admin':
+        await message.reply("У вас нет прав для выполнения этой команды.")
+        return False
+    return True
+
+async def profile_handler(message: types.Message):
+    """Обработчик команды /profile [секунды]: семплирующее профилирование цикла событий."""
+    try:
+        if not await is_admin(message):
+            return
+
+        args = message.get_args().strip()
+        duration = int(args) if args.isdigit() else 30
+        duration = min(max(duration, 1), MAX_PROFILE_SECONDS)
+        if profiler.running:
+            await message.reply("Профилирование уже запущено.")
+            return
+
+        await message.reply(f"Профилирование запущено на {duration} с.")
+        path, top_functions = await profiler.profile(duration)
+        lines = [f"Профилирование завершено, результат сохранен в {path}.", "Чаще всего выполнялись:"]
+        lines += [f"{percentage:.1f}% {name}" for name, percentage in top_functions]
+        await message.reply("\n".join(lines))
+    except Exception as e:
+        logger.error(f"Ошибка в обработчике /profile: {e}")
+        await message.reply("Произошла ошибка при профилировании.")
+
+async def slow_callbacks_handler(message: types.Message):
+    """Обработчик команды /slow_callbacks on [мс] | off."""
+    try:
+        if not await is_admin(message):
+            return
+
+        args = message.get_args().split()
+        if not args or args[0] not in ('on', 'off'):
+            await message.reply("Использование: /slow_callbacks on [порог в мс] | off")
+            return
+
+        if args[0] == 'on':
+            threshold_ms = int(args[1]) if len(args) > 1 and args[1].isdigit() else 100
+            set_slow_callback_detection(True, threshold_ms / 1000)
+            await message.reply(f"Медленные callback-и дольше {threshold_ms} мс будут записываться в лог.")
+        else:
+            set_slow_callback_detection(False)
+            await message.reply("Обнаружение медленных callback-ов выключено.")
+    except Exception as e:
+        logger.error(f"Ошибка в обработчике /slow_callbacks: {e}")
+        await message.reply("Произошла ошибка при настройке обнаружения медленных callback-ов.")
+
+async def trace_handler(message: types.Message):
+    """Обработчик команды /trace on | off: трассировка этапов обработки обновлений."""
+    try:
+        if not await is_admin(message):
+            return
+
+        args = message.get_args().strip()
+        if args == 'on':
+            tracer.enable()
+            await message.reply("Трассировка обновлений включена.")
+        elif args == 'off':
+            tracer.disable()
+            await message.reply(tracer.summary())
+        else:
+            state = "включена" if tracer.enabled else "выключена"
+            await message.reply(f"Трассировка {state}.\n{tracer.summary()}")
+    except Exception as e:
+        logger.error(f"Ошибка в обработчике /trace: {e}")
+        await message.reply("Произошла ошибка при управлении трассировкой.")
+
+async def filter_stats_handler(message: types.Message):
+    """Обработчик команды /filter_stats: счетчики фильтра входящих сообщений."""
+    try:
+        if not await is_admin(message):
+            return
+        await message.reply(update_filter.summary())
+    except Exception as e:
+        logger.error(f"Ошибка в обработчике /filter_stats: {e}")
+        await message.reply("Произошла ошибка при получении статистики фильтра.")
+
 # === Обработчик сообщений ===
 
 async def message_handler(message: types.Message):
@@ -231,32 +289,37 @@ async def message_handler(message: types.Message):
         chat = message.chat
         user_id = message.from_user.id
 
-        # Игнорируем сообщения в группе уведомлений, кроме команд
-        if chat.id == NOTIFICATION_GROUP_ID and not message.text.startswith('/'):
+        # Обычные сообщения отсеивает UpdateFilterMiddleware; сюда также доходят
+        # нераспознанные команды, поэтому дешевые проверки выполняются до запроса роли
+        if chat.id == NOTIFICATION_GROUP_ID or chat.type not in [ChatType.GROUP, ChatType.SUPERGROUP]:
             return
-
-        role = await db.get_user_role(user_id)
-
-        if chat.type not in [ChatType.GROUP, ChatType.SUPERGROUP]:
+        if MONITORED_CHAT_IDS and chat.id not in MONITORED_CHAT_IDS:
             return
 
-#        if message.content_type != ContentType.TEXT:
-#           return
+        with tracer.span('role_lookup'):
+            role = await db.get_user_role(user_id)
 
         # Если сообщение от support или admin, закрываем задачу, если она есть
         if role in ['support', 'admin']:
-            task = await db.get_open_task_by_chat_id(chat.id)
+            with tracer.span('task_lookup'):
+                task = await db.get_open_task_by_chat_id(chat.id)
             if task:
-                await db.increment_support_activity(user_id, message.from_user.username)
-                await db.close_task(task['id'], user_id)
+                with tracer.span('db_write'):
+                    await db.increment_support_activity(user_id, message.from_user.username)
+                    await db.close_task(task['id'], user_id)
+                open_tasks.remove(task['id'])
                 # Удалено двойное логирование о закрытии задачи
         elif role == 'sales':
             return  # Игнорируем сообщения от продажников
         else:
             # Сообщение от клиента
-            task = await db.get_open_task_by_chat_id(chat.id)
+            with tracer.span('task_lookup'):
+                task = await db.get_open_task_by_chat_id(chat.id)
             if not task:
-                await db.create_task(chat.id, chat.title or chat.username or chat.first_name)
+                with tracer.span('db_write'):
+                    task = await db.create_task(chat.id, chat.title or chat.username or chat.first_name)
+                if task:
+                    open_tasks.add(task)
                 # Удалено двойное логирование о создании задачи
                 asyncio.create_task(schedule_notifications(chat.id))
     except Exception as e:
@@ -278,18 +341,19 @@ async def schedule_notifications(chat_id):
             moscow_tz = ZoneInfo('Europe/Moscow')
             created_at_utc = task['created_at'].replace(tzinfo=timezone.utc)
             created_at = created_at_utc.astimezone(moscow_tz)
-            now = datetime.now(moscow_tz)
+            now = clock.now(moscow_tz)
 
             if not is_working_hours(now):
                 next_working_time = get_next_working_period_start(now)
                 sleep_duration = (next_working_time - now).total_seconds()
-                await asyncio.sleep(sleep_duration)
+                await clock.sleep(sleep_duration)
                 continue
 
             working_minutes_elapsed = get_working_minutes_between(created_at, now)
-            time_remaining = 60 - int(working_minutes_elapsed)
+            time_remaining = SLA_MINUTES - int(working_minutes_elapsed)
 
-            if time_remaining in notification_times and time_remaining not in notification_sent:
+            # В режиме табло предупреждения не отправляются: остаток SLA виден на табло
+            if not SLA_BOARD_ENABLED and time_remaining in notification_times and time_remaining not in notification_sent:
                 message_text = (
                     f"🔴 !!!ВНИМАНИЕ!!! До истечения SLA по задаче в чате \"{task['chat_title']}\" осталось {time_remaining} минут.\n"
                     f"Для закрытия задачи введите /close \"{task['chat_title']}\""
@@ -300,6 +364,7 @@ async def schedule_notifications(chat_id):
             if time_remaining <= 0:
                 await db.mark_task_overdue(task['id'])
                 await db.close_task(task['id'], None)
+                open_tasks.remove(task['id'])
                 await bot.send_message(
                     NOTIFICATION_GROUP_ID,
                     f"🔴 !!!ВНИМАНИЕ!!! SLA по задаче \"{task['chat_title']}\" просрочен!\nЗадача закрыта!"
@@ -307,7 +372,7 @@ async def schedule_notifications(chat_id):
                 logger.info(f"Задача {task['id']} автоматически закрыта и отмечена как просроченная.")
                 return
 
-            await asyncio.sleep(30)
+            await clock.sleep(30)
     except Exception as e:
         logger.error(f"Ошибка в функции schedule_notifications: {e}")
 
@@ -319,11 +384,12 @@ async def send_weekly_report():
         logger.info("Формируем еженедельный отчет.")
 
         moscow_tz = ZoneInfo('Europe/Moscow')
-        now = datetime.now(moscow_tz)
+        now = clock.now(moscow_tz)
         last_week = now - timedelta(days=7)
 
-        support_activity = await db.get_support_activity_last_week()
-        sla_violations = await db.get_sla_violations_last_week()
+        # Ошибки БД пробрасываются, чтобы не отправить пустой отчет вместо повтора
+        support_activity = await db.get_support_activity_last_week(raise_errors=True)
+        sla_violations = await db.get_sla_violations_last_week(raise_errors=True)
 
         total_responses = sum(row['responses'] for row in support_activity)
 
@@ -356,6 +422,7 @@ async def send_weekly_report():
         logger.info("Еженедельный отчет отправлен.")
     except Exception as e:
         logger.error(f"Ошибка в функции send_weekly_report: {e}")
+        raise  # Планировщик повторит отправку
 
 # === Регистрация обработчиков ===
 
@@ -370,6 +437,11 @@ def register_handlers(dp: Dispatcher):
         dp.register_message_handler(remove_sales_handler, commands=['remove_sales'])
         dp.register_message_handler(check_roles_handler, commands=['check_roles'])
         dp.register_message_handler(close_task_handler, commands=['close'])
+        dp.register_message_handler(status_handler, commands=['status'])
+        dp.register_message_handler(profile_handler, commands=['profile'])
+        dp.register_message_handler(slow_callbacks_handler, commands=['slow_callbacks'])
+        dp.register_message_handler(trace_handler, commands=['trace'])
+        dp.register_message_handler(filter_stats_handler, commands=['filter_stats'])
         dp.register_message_handler(message_handler, content_types=ContentType.TEXT)
         logger.info("Обработчики успешно зарегистрированы.")
     except Exception as e:
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from collections import OrderedDict
+import clock
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from config import KNOWN_USERS_CACHE_SIZE, KNOWN_USERS_FLUSH_INTERVAL
+from database import db
+
+logger = logging.getLogger(__name__)
+
+
+class KnownUsersCache:
+    """Ограниченный LRU-кэш username → user_id, заполняемый из входящих сообщений.
+
+    Новые и изменившиеся пары накапливаются и периодически сохраняются в таблицу
+    known_users одним запросом, поэтому на каждое сообщение запись в БД не выполняется.
+    """
+
+    def __init__(self, max_size, flush_interval):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._user_ids = OrderedDict()  # username в нижнем регистре -> user_id
+        self._keys = {}                 # user_id -> username в нижнем регистре
+        self._pending = {}              # user_id -> username, еще не сохраненные в БД
+        self._task = None
+
+    def __len__(self):
+        return len(self._user_ids)
+
+    def observe(self, user):
+        """Учет отправителя сообщения."""
+        if user is None or user.is_bot or not user.username:
+            return
+        key = user.username.lower()
+        if self._user_ids.get(key) == user.id:
+            self._user_ids.move_to_end(key)
+            return
+        self._remember(key, user.id)
+        self._pending[user.id] = user.username
+
+    def get(self, username):
+        """Поиск user_id по username только в кэше."""
+        key = username.lower()
+        user_id = self._user_ids.get(key)
+        if user_id is not None:
+            self._user_ids.move_to_end(key)
+        return user_id
+
+    async def resolve(self, username):
+        """Поиск user_id по username: сначала в кэше, затем в БД."""
+        user_id = self.get(username)
+        if user_id is not None:
+            return user_id
+
+        user_id = await db.get_known_user_id(username)
+        if user_id is not None:
+            # Не вытесняем имя, под которым бот уже видел пользователя: оно новее записи в БД
+            if user_id not in self._keys and user_id not in self._pending:
+                self._remember(username.lower(), user_id)
+            return user_id
+
+        # username в staff может быть устаревшим, поэтому такой результат не кэшируется
+        return await db.get_staff_user_id(username)
+
+    def _remember(self, key, user_id):
+        # Пользователь сменил username: старое имя больше не должно на него указывать
+        old_key = self._keys.get(user_id)
+        if old_key is not None and old_key != key:
+            del self._user_ids[old_key]
+        # Username перешел к другому пользователю
+        previous_user_id = self._user_ids.get(key)
+        if previous_user_id is not None and previous_user_id != user_id:
+            del self._keys[previous_user_id]
+
+        self._user_ids[key] = user_id
+        self._keys[user_id] = key
+        self._user_ids.move_to_end(key)
+        if len(self._user_ids) > self.max_size:
+            _, evicted_user_id = self._user_ids.popitem(last=False)
+            del self._keys[evicted_user_id]
+
+    async def flush(self):
+        """Сохранение накопленных пар username → user_id в БД."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        if not await db.save_known_users(list(pending.items())):
+            # Возвращаем несохраненное, не затирая более свежие данные
+            pending.update(self._pending)
+            self._pending = pending
+
+    async def start(self):
+        """Запуск периодического сохранения."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка периодического сохранения с финальной записью."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await clock.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при сохранении известных пользователей: {e}")
+
+
+class KnownUsersMiddleware(BaseMiddleware):
+    """Передает отправителя каждого сообщения в кэш, до фильтрации обновлений."""
+
+    def __init__(self, cache):
+        super().__init__()
+        self.cache = cache
+
+    async def on_pre_process_message(self, message, data):
+        self.cache.observe(message.from_user)
+
+    async def on_pre_process_edited_message(self, message, data):
+        self.cache.observe(message.from_user)
+
+
+# Создание глобального экземпляра кэша
+known_users = KnownUsersCache(KNOWN_USERS_CACHE_SIZE, KNOWN_USERS_FLUSH_INTERVAL)
@@ -1,10 +1,17 @@
 import asyncio
 import logging
+from datetime import time
 from aiogram import Bot, Dispatcher, executor
-from config import BOT_TOKEN
+from aiogram.bot.api import TelegramAPIServer
+from config import BOT_TOKEN, SLA_BOARD_ENABLED, TELEGRAM_API_URL
+from board import sla_board
 from database import db
-from handlers import register_handlers, send_weekly_report, set_bot
-import aioschedule
+from handlers import register_handlers, schedule_notifications, send_weekly_report, set_bot
+from profiling import TracingMiddleware, tracer
+from scheduler import job_scheduler
+from task_index import open_tasks
+from update_filter import update_filter
+from known_users import KnownUsersMiddleware, known_users
 
 
 logging.basicConfig(
@@ -18,18 +25,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def scheduler():
-    """Настройка задач планировщика."""
-    logger.info("Запуск планировщика.")
-    # Еженедельный отчет каждое воскресенье в 20:00 по московскому времени
-    aioschedule.every().sunday.at("20:00").do(send_weekly_report)
-
-    while True:
-        try:
-            await aioschedule.run_pending()
-        except Exception as e:
-            logger.error(f"Ошибка в планировщике: {e}")
-        await asyncio.sleep(60)
+def register_jobs():
+    """Регистрация задач планировщика."""
+    # Еженедельный отчет каждое воскресенье в 20:00 по времени планировщика
+    job_scheduler.add_job('weekly_report', send_weekly_report, at=time(20, 0), weekday=6)
+    # Ежедневная очистка старых закрытых задач
+    job_scheduler.add_job('cleanup_old_tasks', db.cleanup_old_tasks, at=time(3, 0))
 
 async def on_startup(dp):
     """Действия при запуске бота."""
@@ -37,8 +38,16 @@ async def on_startup(dp):
     try:
         await db.connect()
         logger.info("Успешное подключение к базе данных.")
-        asyncio.create_task(scheduler())
+        tasks = await db.get_open_tasks()
+        open_tasks.load(tasks)
+        # Возобновляем отслеживание SLA по задачам, открытым до перезапуска
+        for task in tasks:
+            asyncio.create_task(schedule_notifications(task['chat_id']))
+        await job_scheduler.start()
         logger.info("Планировщик успешно запущен.")
+        await known_users.start()
+        if SLA_BOARD_ENABLED:
+            await sla_board.start(dp.bot)
     except Exception as e:
         logger.critical(f"Критическая ошибка при запуске бота: {e}")
         raise
@@ -47,6 +56,9 @@ async def on_shutdown(dp):
     """Действия при остановке бота."""
     logger.info("Выключение бота...")
     try:
+        await job_scheduler.stop()
+        await sla_board.stop()
+        await known_users.stop()
         await db.close()
         logger.info("Соединение с базой данных успешно закрыто.")
     except Exception as e:
@@ -55,15 +67,30 @@ async def on_shutdown(dp):
 def main():
     """Главная точка входа для запуска бота."""
     try:
-        bot = Bot(token=BOT_TOKEN)
+        if TELEGRAM_API_URL:
+            # Альтернативный сервер Bot API (локальный Bot API или tools/fake_bot_api.py)
+            bot = Bot(token=BOT_TOKEN, server=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+            logger.info(f"Используется сервер Bot API: {TELEGRAM_API_URL}")
+        else:
+            bot = Bot(token=BOT_TOKEN)
         dp = Dispatcher(bot)
 
         # Передаем экземпляр бота в handlers.py
         set_bot(bot)
 
+        # Трассировка обработки обновлений (включается командой /trace)
+        dp.middleware.setup(TracingMiddleware(tracer))
+        # Учет username отправителей всех сообщений, до фильтрации
+        dp.middleware.setup(KnownUsersMiddleware(known_users))
+        # Отсев нерелевантных сообщений до обработчиков и обращений к БД
+        dp.middleware.setup(update_filter)
+
         # Регистрация обработчиков
         register_handlers(dp)
 
+        # Регистрация задач планировщика
+        register_jobs()
+
         # Запуск бота
         executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
     except Exception as e:
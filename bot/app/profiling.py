@@ -0,0 +1,210 @@
+import asyncio
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from config import PROFILE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Интервал между снимками стека при профилировании (секунды)
+SAMPLE_INTERVAL = 0.005
+# Максимальная длительность одного сеанса профилирования (секунды)
+MAX_PROFILE_SECONDS = 300
+
+
+# === Профилирование цикла событий ===
+
+class SamplingProfiler:
+    """Семплирующий профилировщик потока цикла событий.
+
+    Отдельный поток периодически снимает стек потока цикла и считает одинаковые стеки.
+    Результат сохраняется в формате collapsed stacks (flamegraph.pl, speedscope).
+    Пока профилирование не запущено, поток не существует и накладных расходов нет.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.running = False
+
+    async def profile(self, duration):
+        """Профилирование текущего цикла событий в течение duration секунд.
+
+        Возвращает путь к файлу с результатом и самые частые функции.
+        """
+        if self.running:
+            raise RuntimeError("Профилирование уже запущено.")
+        self.running = True
+        samples = Counter()
+        stop_event = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample,
+            args=(threading.get_ident(), samples, stop_event),
+            name="loop-profiler",
+            daemon=True,
+        )
+        try:
+            sampler.start()
+            await asyncio.sleep(duration)
+        finally:
+            stop_event.set()
+            sampler.join()
+            self.running = False
+
+        path = self._dump(samples)
+        logger.info(f"Профилирование завершено: {sum(samples.values())} снимков, результат в {path}.")
+        return path, self._top_functions(samples)
+
+    def _sample(self, thread_id, samples, stop_event):
+        while not stop_event.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                samples[';'.join(reversed(stack))] += 1
+
+    @staticmethod
+    def _dump(samples):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    @staticmethod
+    def _top_functions(samples, limit=10):
+        """Функции, на которых чаще всего находился цикл (по верхушке стека)."""
+        leaves = Counter()
+        for stack, count in samples.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [(name, count / total * 100) for name, count in leaves.most_common(limit)]
+
+
+def set_slow_callback_detection(enabled, threshold=0.1):
+    """Включение отладочного режима asyncio с логированием callback-ов дольше threshold секунд."""
+    loop = asyncio.get_running_loop()
+    loop.slow_callback_duration = threshold
+    loop.set_debug(enabled)
+    logger.info(
+        f"Обнаружение медленных callback-ов {'включено' if enabled else 'выключено'}"
+        f"{f' (порог {threshold * 1000:.0f} мс)' if enabled else ''}."
+    )
+
+
+# === Трассировка обработки обновлений ===
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'started')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace[self.name] = self.trace.get(self.name, 0.0) + time.perf_counter() - self.started
+        return False
+
+
+class UpdateTracer:
+    """Замер времени этапов обработки каждого обновления (роль, поиск задачи, запись в БД, отправка).
+
+    Когда трассировка выключена, span() возвращает общий пустой контекст-менеджер.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stats = {}  # этап -> [количество, суммарное время, максимум]
+
+    def enable(self):
+        self.stats = {}
+        self.enabled = True
+        logger.info("Трассировка обновлений включена.")
+
+    def disable(self):
+        self.enabled = False
+        logger.info("Трассировка обновлений выключена.")
+
+    def span(self, name):
+        """Контекст-менеджер для замера этапа обработки текущего обновления."""
+        if not self.enabled:
+            return _NULL_SPAN
+        trace = _current_trace.get()
+        if trace is None:
+            return _NULL_SPAN
+        return _Span(trace, name)
+
+    def begin(self):
+        _current_trace.set({})
+        return time.perf_counter()
+
+    def finish(self, update_id, started):
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        _current_trace.set(None)
+        trace['total'] = time.perf_counter() - started
+        for name, duration in trace.items():
+            stat = self.stats.setdefault(name, [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += duration
+            stat[2] = max(stat[2], duration)
+        details = ', '.join(f"{name} {duration * 1000:.1f} мс" for name, duration in trace.items())
+        logger.info(f"Трассировка обновления {update_id}: {details}.")
+
+    def summary(self):
+        """Сводка по этапам: количество, среднее и максимальное время."""
+        if not self.stats:
+            return "Данных трассировки нет."
+        lines = ["Трассировка обновлений (кол-во / среднее / максимум):"]
+        for name, (count, total, maximum) in sorted(self.stats.items()):
+            lines.append(f"{name}: {count} / {total / count * 1000:.1f} мс / {maximum * 1000:.1f} мс")
+        return "\n".join(lines)
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Открывает и закрывает трассировку для каждого обновления, если она включена."""
+
+    def __init__(self, tracer):
+        super().__init__()
+        self.tracer = tracer
+
+    async def on_pre_process_update(self, update, data):
+        if self.tracer.enabled:
+            data['trace_started'] = self.tracer.begin()
+
+    async def on_post_process_update(self, update, result, data):
+        if 'trace_started' in data:
+            self.tracer.finish(update.update_id, data['trace_started'])
+
+
+# Создание глобальных экземпляров
+profiler = SamplingProfiler()
+tracer = UpdateTracer()
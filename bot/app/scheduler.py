@@ -0,0 +1,158 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import clock
+from config import SCHEDULER_TIMEZONE
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длительность одного ожидания (в секундах).
+# Защищает от расхождения монотонных и системных часов при долгом сне.
+MAX_SLEEP_SECONDS = 3600
+# Пауза перед первым повтором после ошибки задачи или БД (в секундах), далее удваивается
+RETRY_DELAY_SECONDS = 60
+# Число попыток выполнить задачу за один слот, после которого слот считается выполненным
+MAX_ATTEMPTS = 5
+
+
+def to_utc_naive(dt):
+    """Приведение времени с часовым поясом к наивному UTC, как хранится в БД."""
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class Job:
+    """Задача планировщика: запуск каждый день или раз в неделю в указанное время."""
+
+    def __init__(self, name, func, at, weekday=None):
+        self.name = name
+        self.func = func
+        self.at = at
+        self.weekday = weekday  # 0 - Понедельник, 6 - Воскресенье; None - ежедневно
+
+    @property
+    def period(self):
+        return timedelta(days=1 if self.weekday is None else 7)
+
+    def previous_run(self, now):
+        """Последний момент запуска по расписанию, не позднее now."""
+        date = now.date()
+        if self.weekday is not None:
+            date -= timedelta(days=(date.weekday() - self.weekday) % 7)
+        slot = datetime.combine(date, self.at, tzinfo=now.tzinfo)
+        if slot > now:
+            slot = datetime.combine(date - self.period, self.at, tzinfo=now.tzinfo)
+        return slot
+
+    def next_run(self, now):
+        """Ближайший момент запуска по расписанию, строго позже now."""
+        date = self.previous_run(now).date() + self.period
+        return datetime.combine(date, self.at, tzinfo=now.tzinfo)
+
+
+class JobScheduler:
+    """Планировщик, который спит до ближайшей задачи и хранит время запусков в БД.
+
+    Перед выполнением задача атомарно «забирает» свой слот в таблице scheduled_jobs,
+    поэтому один и тот же слот не выполняется дважды даже после перезапуска.
+    Пропущенный во время простоя слот выполняется сразу после старта.
+    Если задача завершилась исключением или БД недоступна, слот остается невыполненным
+    и попытка повторяется с удваивающейся паузой, не задерживая остальные задачи.
+    После MAX_ATTEMPTS неудачных попыток слот остается отмеченным как выполненный.
+    Задачи, которые сами перехватывают свои ошибки, считаются выполненными.
+    """
+
+    def __init__(self, tz_name):
+        self.tz = ZoneInfo(tz_name)
+        self.jobs = []
+        self._task = None
+        self._retry_at = {}  # имя задачи -> время следующей попытки
+        self._attempts = {}  # имя задачи -> (слот, число неудачных попыток)
+
+    def add_job(self, name, func, at, weekday=None):
+        """Регистрация задачи. Должна вызываться до start()."""
+        self.jobs.append(Job(name, func, at, weekday))
+
+    async def start(self):
+        """Регистрация задач в БД и запуск цикла планировщика."""
+        now = clock.now(self.tz)
+        for job in self.jobs:
+            # При первой регистрации считаем последний слот выполненным,
+            # чтобы новая задача не срабатывала сразу при развертывании.
+            await db.register_job(job.name, to_utc_naive(job.previous_run(now)))
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Планировщик запущен, часовой пояс {self.tz.key}, задач: {len(self.jobs)}.")
+
+    async def stop(self):
+        """Остановка цикла планировщика."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+            logger.info("Планировщик остановлен.")
+
+    async def _run(self):
+        while True:
+            try:
+                for job in self.jobs:
+                    now = clock.now(self.tz)
+                    retry_at = self._retry_at.get(job.name)
+                    if retry_at is not None:
+                        if retry_at > now:
+                            continue
+                        del self._retry_at[job.name]
+                    await self._run_if_due(job, now)
+
+                if not self.jobs:
+                    return
+                now = clock.now(self.tz)
+                next_at = min([job.next_run(now) for job in self.jobs] + list(self._retry_at.values()))
+                delay = min((next_at - now).total_seconds(), MAX_SLEEP_SECONDS)
+                logger.debug(f"Следующий запуск планировщика: {next_at}.")
+            except Exception as e:
+                logger.error(f"Ошибка в планировщике, повтор через {RETRY_DELAY_SECONDS} с: {e}")
+                delay = RETRY_DELAY_SECONDS
+            await clock.sleep(max(delay, 0))
+
+    async def _run_if_due(self, job, now):
+        slot = job.previous_run(now)
+        try:
+            if not await db.claim_job_run(job.name, to_utc_naive(slot)):
+                return
+        except Exception:
+            # Ошибка БД уже записана в лог; слот не забран, проверим его позже
+            self._retry_at[job.name] = now + timedelta(seconds=RETRY_DELAY_SECONDS)
+            return
+
+        logger.info(f"Запуск задачи планировщика {job.name} (слот {slot}).")
+        try:
+            await job.func()
+        except Exception as e:
+            await self._handle_failure(job, slot, e)
+        else:
+            self._attempts.pop(job.name, None)
+
+    async def _handle_failure(self, job, slot, error):
+        """Возврат слота для повтора с удваивающейся паузой или отказ после MAX_ATTEMPTS."""
+        previous_slot, attempts = self._attempts.get(job.name, (None, 0))
+        attempt = attempts + 1 if previous_slot == slot else 1
+        if attempt >= MAX_ATTEMPTS:
+            self._attempts.pop(job.name, None)
+            logger.error(f"Задача планировщика {job.name} не выполнена за {attempt} попыток, "
+                         f"слот {slot} пропущен: {error}")
+            return
+
+        self._attempts[job.name] = (slot, attempt)
+        delay = RETRY_DELAY_SECONDS * 2 ** (attempt - 1)
+        logger.error(f"Ошибка при выполнении задачи планировщика {job.name} "
+                     f"(попытка {attempt} из {MAX_ATTEMPTS}), повтор через {delay} с: {error}")
+        try:
+            # Возвращаем слот, чтобы задача была повторена после паузы
+            await db.release_job_run(job.name, to_utc_naive(slot), to_utc_naive(slot - job.period))
+        except Exception:
+            return
+        self._retry_at[job.name] = clock.now(self.tz) + timedelta(seconds=delay)
+
+
+# Создание глобального экземпляра планировщика
+job_scheduler = JobScheduler(SCHEDULER_TIMEZONE)
@@ -0,0 +1,95 @@
+import heapq
+import logging
+from collections import namedtuple
+from datetime import timezone
+from itertools import islice
+from working_hours import SLA_MINUTES, add_working_minutes
+
+logger = logging.getLogger(__name__)
+
+OpenTask = namedtuple('OpenTask', ['task_id', 'chat_id', 'chat_title', 'deadline'])
+
+
+class OpenTaskIndex:
+    """Упорядоченное по дедлайну SLA представление открытых задач в памяти.
+
+    Дедлайн вычисляется один раз при добавлении задачи. Добавление стоит O(log n),
+    удаление — амортизированно O(log n) (запись в куче помечается устаревшей и снимается,
+    когда оказывается на вершине),
+    выборка k ближайших к нарушению задач — O(k log k) без изменения кучи.
+    """
+
+    def __init__(self):
+        self._heap = []   # (deadline, task_id)
+        self._tasks = {}  # task_id -> OpenTask
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def load(self, tasks):
+        """Заполнение индекса записями открытых задач из БД."""
+        self._tasks = {}
+        for task in tasks:
+            entry = self._make_entry(task)
+            self._tasks[entry.task_id] = entry
+        self._heap = [(entry.deadline, entry.task_id) for entry in self._tasks.values()]
+        heapq.heapify(self._heap)
+        logger.info(f"Индекс открытых задач загружен: {len(self._tasks)}.")
+
+    def add(self, task):
+        """Добавление открытой задачи (запись из таблицы tasks)."""
+        entry = self._make_entry(task)
+        self._tasks[entry.task_id] = entry
+        heapq.heappush(self._heap, (entry.deadline, entry.task_id))
+
+    def remove(self, task_id):
+        """Удаление задачи из индекса."""
+        if self._tasks.pop(task_id, None) is None:
+            return
+        # Снимаем устаревшие записи с вершины, чтобы обход начинался с живой задачи
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+        # Устаревшие записи в глубине кучи убираем перестроением, когда они начинают преобладать
+        if len(self._heap) > 2 * len(self._tasks) + 64:
+            self._heap = [(entry.deadline, entry.task_id) for entry in self._tasks.values()]
+            heapq.heapify(self._heap)
+
+    def iter_by_deadline(self):
+        """Обход открытых задач в порядке возрастания дедлайна."""
+        heap = self._heap
+        if not heap:
+            return
+        frontier = [(heap[0], 0)]
+        while frontier:
+            item, position = heapq.heappop(frontier)
+            if self._is_live(item):
+                yield self._tasks[item[1]]
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+
+    def page(self, limit, offset=0, predicate=None):
+        """Страница задач, ближайших к нарушению SLA, с необязательным фильтром."""
+        entries = self.iter_by_deadline()
+        if predicate:
+            entries = filter(predicate, entries)
+        return list(islice(entries, offset, offset + limit))
+
+    def _is_live(self, item):
+        deadline, task_id = item
+        entry = self._tasks.get(task_id)
+        return entry is not None and entry.deadline == deadline
+
+    @staticmethod
+    def _make_entry(task):
+        created_at = task['created_at'].replace(tzinfo=timezone.utc)
+        return OpenTask(
+            task_id=task['id'],
+            chat_id=task['chat_id'],
+            chat_title=task['chat_title'],
+            deadline=add_working_minutes(created_at, SLA_MINUTES),
+        )
+
+
+# Создание глобального индекса открытых задач
+open_tasks = OpenTaskIndex()
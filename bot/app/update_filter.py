@@ -0,0 +1,77 @@
+import logging
+from collections import Counter
+from aiogram.dispatcher.handler import CancelHandler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.types import ChatType
+from config import MONITORED_CHAT_IDS, NOTIFICATION_GROUP_ID
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateFilterMiddleware(BaseMiddleware):
+    """Отсев нерелевантных обновлений до запуска обработчиков.
+
+    Решение принимается только по полям самого сообщения, без обращений к БД.
+    Команды пропускаются всегда (их права проверяют сами обработчики), остальные
+    сообщения — только текстовые от людей в отслеживаемых группах.
+    Количество отброшенных обновлений считается по причинам.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.passed = 0
+        self.rejected = Counter()
+
+    async def on_pre_process_message(self, message, data):
+        reason = self.classify(message)
+        if reason:
+            self.rejected[reason] += 1
+            raise CancelHandler()
+        self.passed += 1
+
+    async def on_pre_process_edited_message(self, message, data):
+        self.rejected['edited_message'] += 1
+        raise CancelHandler()
+
+    async def on_pre_process_channel_post(self, message, data):
+        self.rejected['channel_post'] += 1
+        raise CancelHandler()
+
+    async def on_pre_process_edited_channel_post(self, message, data):
+        self.rejected['channel_post'] += 1
+        raise CancelHandler()
+
+    @staticmethod
+    def classify(message):
+        """Причина отсева сообщения или None, если сообщение нужно обработать."""
+        user = message.from_user
+        if user is None:
+            return 'no_sender'
+        if user.is_bot:
+            return 'bot_sender'
+
+        text = message.text
+        if text is not None and text.startswith('/'):
+            return None
+
+        chat = message.chat
+        if chat.type not in (ChatType.GROUP, ChatType.SUPERGROUP):
+            return 'not_group'
+        if chat.id == NOTIFICATION_GROUP_ID:
+            return 'notification_group'
+        if MONITORED_CHAT_IDS and chat.id not in MONITORED_CHAT_IDS:
+            return 'not_monitored'
+        if text is None:
+            return 'not_text'
+        return None
+
+    def summary(self):
+        """Сводка по пропущенным и отброшенным сообщениям."""
+        lines = [f"Пропущено к обработчикам: {self.passed}", f"Отброшено: {sum(self.rejected.values())}"]
+        for reason, count in self.rejected.most_common():
+            lines.append(f"- {reason}: {count}")
+        return "\n".join(lines)
+
+
+# Создание глобального экземпляра фильтра
+update_filter = UpdateFilterMiddleware()
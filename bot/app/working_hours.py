@@ -0,0 +1,120 @@
+import logging
+from datetime import datetime, timedelta, time
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+# Норматив SLA: рабочих минут на ответ клиенту
+SLA_MINUTES = 60
+
+def is_working_hours(now=None):
+    """Проверяет, является ли указанное время рабочим."""
+    try:
+        moscow_tz = ZoneInfo('Europe/Moscow')
+        now = now or datetime.now(moscow_tz)
+        weekday = now.weekday()  # 0 - Понедельник, 6 - Воскресенье
+        current_time = now.time()
+
+        if weekday < 5:  # Будни
+            start_time = time(7, 0)
+            end_time = time(23, 0)
+        else:  # Выходные
+            start_time = time(10, 0)
+            end_time = time(19, 0)
+
+        return start_time <= current_time < end_time
+    except Exception as e:
+        logger.error(f"Ошибка в функции is_working_hours: {e}")
+        return False
+
+def get_next_working_period_start(now=None):
+    
+    try:
+        moscow_tz = ZoneInfo('Europe/Moscow')
+        now = now or datetime.now(moscow_tz)
+        current_date = now.date()
+
+        days_ahead = 0
+        while True:
+            next_date = current_date + timedelta(days=days_ahead)
+            next_weekday = next_date.weekday()
+            if next_weekday < 5:
+                start_time = time(7, 0)
+            else:
+                start_time = time(10, 0)
+            next_start_datetime = datetime.combine(next_date, start_time, tzinfo=moscow_tz)
+            if next_start_datetime > now:
+                return next_start_datetime
+            days_ahead += 1
+    except Exception as e:
+        logger.error(f"Ошибка в функции get_next_working_period_start: {e}")
+        return now or datetime.now()
+
+def get_working_minutes_between(start_dt, end_dt):
+    """Вычисляет количество рабочих минут между двумя датами."""
+    try:
+        total_minutes = 0
+        current_dt = start_dt
+        moscow_tz = ZoneInfo('Europe/Moscow')
+
+        while current_dt < end_dt:
+            weekday = current_dt.weekday()
+            if weekday < 5:
+                start_time = time(7, 0)
+                end_time = time(23, 0)
+            else:
+                start_time = time(10, 0)
+                end_time = time(19, 0)
+
+            working_start = datetime.combine(current_dt.date(), start_time, tzinfo=moscow_tz)
+            working_end = datetime.combine(current_dt.date(), end_time, tzinfo=moscow_tz)
+
+            if current_dt < working_start:
+                current_dt = working_start
+
+            if current_dt >= working_end:
+                current_dt = datetime.combine(current_dt.date() + timedelta(days=1), time(0, 0), tzinfo=moscow_tz)
+                continue
+
+            interval_end = min(end_dt, working_end)
+            minutes = (interval_end - current_dt).total_seconds() / 60
+            total_minutes += minutes
+            current_dt = interval_end
+
+        return total_minutes
+    except Exception as e:
+        logger.error(f"Ошибка в функции get_working_minutes_between: {e}")
+        return 0
+
+def add_working_minutes(start_dt, minutes):
+    """Возвращает момент, когда от start_dt пройдет указанное количество рабочих минут."""
+    try:
+        moscow_tz = ZoneInfo('Europe/Moscow')
+        current_dt = start_dt.astimezone(moscow_tz)
+        remaining = timedelta(minutes=minutes)
+
+        while True:
+            weekday = current_dt.weekday()
+            if weekday < 5:
+                start_time = time(7, 0)
+                end_time = time(23, 0)
+            else:
+                start_time = time(10, 0)
+                end_time = time(19, 0)
+
+            working_start = datetime.combine(current_dt.date(), start_time, tzinfo=moscow_tz)
+            working_end = datetime.combine(current_dt.date(), end_time, tzinfo=moscow_tz)
+
+            if current_dt < working_start:
+                current_dt = working_start
+
+            if current_dt < working_end:
+                available = working_end - current_dt
+                if remaining <= available:
+                    return current_dt + remaining
+                remaining -= available
+
+            current_dt = datetime.combine(current_dt.date() + timedelta(days=1), time(0, 0), tzinfo=moscow_tz)
+    except Exception as e:
+        logger.error(f"Ошибка в функции add_working_minutes: {e}")
+        return start_dt + timedelta(minutes=minutes)
@@ -0,0 +1,242 @@
+"""Локальная замена Telegram Bot API для сквозных и нагрузочных прогонов бота.
+
+Реализует getMe, getUpdates, setWebhook, deleteWebhook, getWebhookInfo, sendMessage,
+editMessageText и pinChatMessage, а также ответы 429 с retry_after при превышении лимитов
+отправки. Бот подключается к серверу через переменную окружения TELEGRAM_API_URL.
+
+Запуск отдельно:
+    python fake_bot_api.py --port 8081
+
+Управление в отдельном режиме:
+    POST /_fake/updates  - JSON объекта message, который будет выдан боту как новое обновление
+    GET  /_fake/sent     - журнал сообщений, отправленных и отредактированных ботом
+"""
+import argparse
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram: сообщений в минуту в одну группу и сообщений в секунду суммарно
+GROUP_LIMIT_PER_MINUTE = 20
+GLOBAL_LIMIT_PER_SECOND = 30
+# Максимальное время ожидания long polling (секунды)
+MAX_POLL_TIMEOUT = 50
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'SLA Bot', 'username': 'sla_test_bot'}
+
+
+class FakeBotAPI:
+    """Состояние поддельного Bot API: очередь обновлений, журнал отправок и лимиты.
+
+    time_scale и time_origin задают ускоренное время так же, как TIME_SCALE и TIME_ORIGIN
+    бота: лимиты и отметки времени в журнале считаются во времени бота, а retry_after
+    возвращается в реальных секундах.
+    """
+
+    def __init__(self, time_scale=1.0, time_origin=None,
+                 group_limit=GROUP_LIMIT_PER_MINUTE, global_limit=GLOBAL_LIMIT_PER_SECOND):
+        self.time_scale = time_scale
+        self.time_origin = time_origin if time_origin is not None else time.time()
+        self.group_limit = group_limit
+        self.global_limit = global_limit
+
+        self.updates = []
+        self._next_update_id = 1
+        self._new_update = asyncio.Event()
+        # Устанавливается при первом long polling: бот выполнил on_startup и принимает обновления
+        self.polling_started = asyncio.Event()
+        self.webhook_url = ''
+
+        self.sent = []                # журнал sendMessage/editMessageText
+        self.messages = {}            # (chat_id, message_id) -> текст
+        self._next_message_id = {}    # chat_id -> следующий message_id
+        self._group_window = {}       # chat_id -> deque отметок времени
+        self._global_window = deque()
+        self.rate_limited = 0
+        self.requests = 0
+
+    def now(self):
+        """Текущее время в масштабе бота (unix time)."""
+        return self.time_origin + (time.time() - self.time_origin) * self.time_scale
+
+    # === Обновления ===
+
+    def push_message(self, message):
+        """Добавление входящего сообщения в очередь обновлений."""
+        update = {'update_id': self._next_update_id, 'message': message}
+        self._next_update_id += 1
+        self.updates.append(update)
+        self._new_update.set()
+        return update
+
+    async def get_updates(self, offset=0, limit=100, timeout=0):
+        if timeout:
+            self.polling_started.set()
+        if offset < 0:
+            return self.updates[offset:]
+        if offset:
+            self.updates = [u for u in self.updates if u['update_id'] >= offset]
+        if not self.updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), min(timeout, MAX_POLL_TIMEOUT))
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:limit]
+
+    # === Отправка ===
+
+    def _check_rate_limit(self, chat_id):
+        """Возвращает retry_after в реальных секундах, если лимит превышен, иначе None."""
+        now = self.now()
+        while self._global_window and now - self._global_window[0] >= 1:
+            self._global_window.popleft()
+        window = self._group_window.setdefault(chat_id, deque())
+        while window and now - window[0] >= 60:
+            window.popleft()
+
+        wait = 0
+        if len(self._global_window) >= self.global_limit:
+            wait = max(wait, 1 - (now - self._global_window[0]))
+        if chat_id < 0 and len(window) >= self.group_limit:
+            wait = max(wait, 60 - (now - window[0]))
+        if wait > 0:
+            self.rate_limited += 1
+            return max(1, math.ceil(wait / self.time_scale))
+        return None
+
+    def _record(self, method, chat_id, message_id, text):
+        now = self.now()
+        # В лимиты засчитываются только успешные отправки
+        self._global_window.append(now)
+        self._group_window[chat_id].append(now)
+        self.sent.append({
+            'method': method,
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'text': text,
+            'at': now,
+        })
+
+    def send_message(self, chat_id, text):
+        message_id = self._next_message_id.get(chat_id, 1)
+        self._next_message_id[chat_id] = message_id + 1
+        self.messages[(chat_id, message_id)] = text
+        self._record('sendMessage', chat_id, message_id, text)
+        return self._message(chat_id, message_id, text)
+
+    def edit_message_text(self, chat_id, message_id, text):
+        current = self.messages.get((chat_id, message_id))
+        if current is None:
+            raise ApiError(400, "Bad Request: message to edit not found")
+        if current == text:
+            raise ApiError(400, "Bad Request: message is not modified: specified new message content "
+                                "and reply markup are exactly the same as a current content")
+        self.messages[(chat_id, message_id)] = text
+        self._record('editMessageText', chat_id, message_id, text)
+        return self._message(chat_id, message_id, text)
+
+    def _message(self, chat_id, message_id, text):
+        return {
+            'message_id': message_id,
+            'date': int(self.now()),
+            'chat': {'id': chat_id, 'type': 'supergroup' if chat_id < 0 else 'private'},
+            'from': BOT_USER,
+            'text': text,
+        }
+
+    # === HTTP ===
+
+    async def handle(self, request):
+        self.requests += 1
+        method = request.match_info['method']
+        params = dict(request.query)
+        if request.content_type == 'application/json':
+            params.update(await request.json())
+        elif request.can_read_body:
+            params.update(await request.post())
+
+        try:
+            result = await self.dispatch(method.lower(), params)
+        except ApiError as e:
+            payload = {'ok': False, 'error_code': e.code, 'description': e.description}
+            if e.retry_after:
+                payload['parameters'] = {'retry_after': e.retry_after}
+            return web.json_response(payload, status=e.code)
+        return web.json_response({'ok': True, 'result': result})
+
+    async def dispatch(self, method, params):
+        if method == 'getme':
+            return BOT_USER
+        if method == 'getupdates':
+            return await self.get_updates(
+                offset=int(params.get('offset') or 0),
+                limit=int(params.get('limit') or 100),
+                timeout=float(params.get('timeout') or 0),
+            )
+        if method == 'setwebhook':
+            self.webhook_url = params.get('url', '')
+            return True
+        if method == 'deletewebhook':
+            self.webhook_url = ''
+            if str(params.get('drop_pending_updates')).lower() == 'true':
+                self.updates = []
+            return True
+        if method == 'getwebhookinfo':
+            return {'url': self.webhook_url, 'has_custom_certificate': False,
+                    'pending_update_count': len(self.updates)}
+        if method in ('sendmessage', 'editmessagetext'):
+            chat_id = int(params['chat_id'])
+            retry_after = self._check_rate_limit(chat_id)
+            if retry_after:
+                raise ApiError(429, f"Too Many Requests: retry after {retry_after}", retry_after)
+            if method == 'sendmessage':
+                return self.send_message(chat_id, params['text'])
+            return self.edit_message_text(chat_id, int(params['message_id']), params['text'])
+        # Остальные методы (pinChatMessage и т.п.) считаются успешными
+        return True
+
+    async def control_updates(self, request):
+        return web.json_response(self.push_message(await request.json()))
+
+    async def control_sent(self, request):
+        return web.json_response({'sent': self.sent, 'rate_limited': self.rate_limited})
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        app.router.add_post('/_fake/updates', self.control_updates)
+        app.router.add_get('/_fake/sent', self.control_sent)
+        return app
+
+
+class ApiError(Exception):
+    def __init__(self, code, description, retry_after=None):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+        self.retry_after = retry_after
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена Telegram Bot API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--group-limit', type=int, default=GROUP_LIMIT_PER_MINUTE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    async def make_app():
+        return FakeBotAPI(group_limit=args.group_limit).make_app()
+
+    web.run_app(make_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""Нагрузочный прогон бота против tools/fake_bot_api.py в ускоренном времени.
+
+Драйвер поднимает поддельный Bot API, запускает bot/app/main.py отдельным процессом
+с TIME_SCALE/TIME_ORIGIN и генерирует трафик клиентов и сотрудников поддержки
+за указанное число часов времени бота. По итогам выводит:
+- темп отправки сообщений ботом и количество ответов 429;
+- своевременность сообщений о нарушении SLA относительно ожидаемых дедлайнов;
+- рост потребляемой памяти (RSS) процесса бота.
+
+Требуется PostgreSQL: переменные DB_* берутся из окружения. Используйте отдельную
+базу данных — драйвер добавляет в таблицу staff тестового сотрудника поддержки.
+
+Пример:
+    DB_USER=postgres DB_PASSWORD=... DB_NAME=sla_soak DB_HOST=localhost DB_PORT=5432 \\
+        python soak_test.py --hours 12 --speedup 120 --chats 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import asyncpg
+from aiohttp import web
+from cryptography.fernet import Fernet
+from fake_bot_api import FakeBotAPI
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+from working_hours import SLA_MINUTES, add_working_minutes  # noqa: E402
+
+BOT_TOKEN = '123456:SOAK-TEST-TOKEN'
+NOTIFICATION_GROUP_ID = -1000
+SUPPORT_USER_ID = 500
+BREACH_PATTERN = re.compile(r'SLA по задаче "(.+)" просрочен')
+# Запас времени бота после дедлайна, в течение которого ждем сообщение о нарушении (минуты)
+BREACH_GRACE_MINUTES = 5
+
+
+def build_traffic(args, origin):
+    """Генерация сообщений клиентов и ответов поддержки: список (время бота, chat_id, user_id)."""
+    rng = random.Random(args.seed)
+    horizon = args.hours * 3600
+    events = []
+    for index in range(args.chats):
+        chat_id = -100000 - index
+        client_id = 10000 + index
+        t = rng.expovariate(args.rate / 3600)
+        while t < horizon:
+            events.append((origin + t, chat_id, client_id))
+            if rng.random() < args.reply_probability:
+                reply_at = t + rng.expovariate(1 / (args.reply_minutes * 60))
+                if reply_at < horizon:
+                    events.append((origin + reply_at, chat_id, SUPPORT_USER_ID))
+            t += rng.expovariate(args.rate / 3600)
+    events.sort()
+    return events
+
+
+def make_message(message_id, at, chat_id, user_id):
+    return {
+        'message_id': message_id,
+        'date': int(at),
+        'chat': {'id': chat_id, 'type': 'supergroup', 'title': f"soak-chat-{-chat_id - 100000}"},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}", 'username': f"user{user_id}"},
+        'text': "Сообщение нагрузочного теста",
+    }
+
+
+def read_rss_kb(pid):
+    """RSS процесса в килобайтах (Linux)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+async def sample_memory(pid, samples, interval, api):
+    while True:
+        rss = read_rss_kb(pid)
+        if rss is not None:
+            samples.append((api.now(), rss))
+        await asyncio.sleep(interval)
+
+
+async def wait_for_bot(api, process, timeout=60):
+    """Ожидание начала long polling: к этому моменту бот выполнил on_startup и создал таблицы."""
+    deadline = time.time() + timeout
+    while not api.polling_started.is_set():
+        if process.returncode is not None or time.time() > deadline:
+            raise RuntimeError("Бот не запустился, см. bot.log.")
+        await asyncio.sleep(0.2)
+
+
+async def add_support_user():
+    connection = await asyncpg.connect(
+        user=os.environ['DB_USER'], password=os.environ['DB_PASSWORD'], database=os.environ['DB_NAME'],
+        host=os.environ['DB_HOST'], port=os.environ['DB_PORT'],
+    )
+    try:
+        await connection.execute("""
+            INSERT INTO staff (user_id, username, role) VALUES ($1, $2, 'support')
+            ON CONFLICT (user_id) DO UPDATE SET role = 'support'
+        """, SUPPORT_USER_ID, f"user{SUPPORT_USER_ID}")
+    finally:
+        await connection.close()
+
+
+def report(args, api, events, expected_breaches, memory):
+    moscow_tz = ZoneInfo('Europe/Moscow')
+    print(f"\n=== Итоги прогона: {args.hours} ч времени бота, ускорение x{args.speedup:g} ===")
+
+    # Темп отправки
+    sends = [item for item in api.sent if item['chat_id'] == NOTIFICATION_GROUP_ID]
+    per_minute = {}
+    for item in sends:
+        minute = int(item['at'] // 60)
+        per_minute[minute] = per_minute.get(minute, 0) + 1
+    print(f"Входящих сообщений: {len(events)}")
+    print(f"Вызовов sendMessage/editMessageText в группу уведомлений: {len(sends)} "
+          f"(send: {sum(1 for i in sends if i['method'] == 'sendMessage')}, "
+          f"edit: {sum(1 for i in sends if i['method'] == 'editMessageText')})")
+    if per_minute:
+        print(f"В среднем {len(sends) / (args.hours * 60):.2f} в минуту, максимум {max(per_minute.values())} в минуту")
+    print(f"Ответов 429: {api.rate_limited}")
+
+    # Своевременность сообщений о нарушении SLA
+    observed = {}
+    for item in sends:
+        match = BREACH_PATTERN.search(item['text'])
+        if match:
+            observed.setdefault(match.group(1), []).append(item['at'])
+    delays, missed = [], 0
+    for chat_title, deadlines in expected_breaches.items():
+        alerts = sorted(observed.get(chat_title, []))
+        for deadline in deadlines:
+            alert = next((at for at in alerts if at >= deadline - 60), None)
+            if alert is None or alert > deadline + BREACH_GRACE_MINUTES * 60:
+                missed += 1
+            else:
+                alerts.remove(alert)
+                delays.append(alert - deadline)
+    expected_total = sum(len(deadlines) for deadlines in expected_breaches.values())
+    print(f"Ожидаемых нарушений SLA: {expected_total}, сообщений о нарушении: {sum(len(v) for v in observed.values())}")
+    if delays:
+        delays.sort()
+        print(f"Задержка сообщения о нарушении, с (время бота): медиана {delays[len(delays) // 2]:.0f}, "
+              f"p95 {delays[int(len(delays) * 0.95)]:.0f}, максимум {delays[-1]:.0f}")
+    print(f"Пропущено или опоздало более чем на {BREACH_GRACE_MINUTES} мин: {missed}")
+
+    # Память
+    if len(memory) >= 2:
+        (start_at, start_rss), (end_at, end_rss) = memory[0], memory[-1]
+        hours = (end_at - start_at) / 3600 or 1
+        print(f"RSS: начало {start_rss} КБ, конец {end_rss} КБ, максимум {max(rss for _, rss in memory)} КБ, "
+              f"рост {(end_rss - start_rss) / hours:.1f} КБ/ч времени бота")
+    start = datetime.fromtimestamp(memory[0][0] if memory else api.time_origin, moscow_tz)
+    print(f"Начало прогона по времени бота: {start.strftime('%Y-%m-%d %H:%M')} (МСК)")
+
+
+def expected_breach_deadlines(events):
+    """Дедлайны задач, на которые поддержка не ответила вовремя, по названию чата."""
+    open_since = {}
+    breaches = {}
+    for at, chat_id, user_id in events:
+        chat_title = f"soak-chat-{-chat_id - 100000}"
+        deadline = open_since.get(chat_id)
+        if deadline is not None and at >= deadline:
+            breaches.setdefault(chat_title, []).append(deadline)
+            open_since.pop(chat_id)
+            deadline = None
+        if user_id == SUPPORT_USER_ID:
+            open_since.pop(chat_id, None)
+        elif deadline is None:
+            created_at = datetime.fromtimestamp(at, timezone.utc)
+            open_since[chat_id] = add_working_minutes(created_at, SLA_MINUTES).timestamp()
+    for chat_id, deadline in open_since.items():
+        breaches.setdefault(f"soak-chat-{-chat_id - 100000}", []).append(deadline)
+    return breaches
+
+
+async def run(args):
+    origin = time.time()
+    api = FakeBotAPI(time_scale=args.speedup, time_origin=origin, group_limit=args.group_limit)
+    runner = web.AppRunner(api.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.port).start()
+
+    key = Fernet.generate_key()
+    env = dict(os.environ)
+    env.update({
+        'TELEGRAM_API_URL': f"http://127.0.0.1:{args.port}",
+        'ENCRYPTION_KEY': key.decode(),
+        'ENCRYPTED_TOKEN': Fernet(key).encrypt(BOT_TOKEN.encode()).decode(),
+        'NOTIFICATION_GROUP_ID': str(NOTIFICATION_GROUP_ID),
+        'TIMEZONE': env.get('TIMEZONE', 'Europe/Moscow'),
+        'TIME_SCALE': str(args.speedup),
+        'TIME_ORIGIN': str(origin),
+    })
+    if args.board:
+        env['SLA_BOARD_ENABLED'] = 'true'
+    process = await asyncio.create_subprocess_exec(sys.executable, 'main.py', cwd=APP_DIR, env=env)
+
+    memory = []
+    sampler = None
+    try:
+        await wait_for_bot(api, process)
+        await add_support_user()
+        sampler = asyncio.create_task(sample_memory(process.pid, memory, args.memory_interval, api))
+
+        events = build_traffic(args, api.now())
+        print(f"Бот запущен (pid {process.pid}), сообщений в сценарии: {len(events)}")
+        for message_id, (at, chat_id, user_id) in enumerate(events, start=1):
+            delay = (at - api.now()) / args.speedup
+            if delay > 0:
+                await asyncio.sleep(delay)
+            api.push_message(make_message(message_id, at, chat_id, user_id))
+
+        # Даем боту отработать дедлайны, приходящиеся на конец сценария
+        await asyncio.sleep((SLA_MINUTES + BREACH_GRACE_MINUTES) * 60 / args.speedup)
+    finally:
+        if sampler:
+            sampler.cancel()
+        if process.returncode is None:
+            process.terminate()
+            await process.wait()
+        await runner.cleanup()
+
+    report(args, api, events, expected_breach_deadlines(events), memory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота в ускоренном времени")
+    parser.add_argument('--hours', type=float, default=8, help="длительность сценария во времени бота, ч")
+    parser.add_argument('--speedup', type=float, default=60, help="во сколько раз время бота идет быстрее")
+    parser.add_argument('--chats', type=int, default=50, help="количество клиентских чатов")
+    parser.add_argument('--rate', type=float, default=2, help="сообщений клиента в час на чат")
+    parser.add_argument('--reply-probability', type=float, default=0.8, help="доля сообщений с ответом поддержки")
+    parser.add_argument('--reply-minutes', type=float, default=30, help="среднее время ответа поддержки, мин")
+    parser.add_argument('--group-limit', type=int, default=20, help="лимит сообщений в минуту в группу")
+    parser.add_argument('--board', action='store_true', help="включить режим табло SLA")
+    parser.add_argument('--memory-interval', type=float, default=1, help="интервал замера памяти, с")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--seed', type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()